@@ -2,10 +2,12 @@ from .base import (
     JETSTREAM,
     NatsAdapter,
     NatsProvider,
+    NatsWorkflowSession,
 )
 
 __all__ = [
     "JETSTREAM",
     "NatsAdapter",
     "NatsProvider",
+    "NatsWorkflowSession",
 ]
@@ -1,20 +1,22 @@
 ## IONats part
 
 import asyncio
+import math
 import os
+import threading
 import traceback
-from collections.abc import AsyncIterator, Iterator
+from collections.abc import AsyncIterator, Coroutine, Iterator
 from contextlib import asynccontextmanager, contextmanager
-from queue import Queue
-from typing import TYPE_CHECKING, Any, Optional
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Optional, TypeVar
 
+from anyio import CapacityLimiter, Semaphore
 from asyncer import asyncify, syncify
 from faststream import FastStream, Logger
-from faststream.nats import JStream, NatsBroker, NatsMessage
+from faststream.nats import JStream, NatsBroker, NatsMessage, PullSub
 from nats.aio.client import Client as NatsClient
 from nats.errors import NoServersError
-from nats.js import JetStreamContext, api
-from nats.js.errors import KeyNotFoundError, NoKeysError
+from nats.js import api
 from nats.js.kv import KeyValue
 
 from ...base import UI, CreateWorkflowUIMixin, ProviderProtocol, Runnable, UIBase
@@ -29,6 +31,7 @@ from ...messages import (
     MultipleChoice,
     TextInput,
     TextMessage,
+    WorkflowCompleted,
 )
 
 if TYPE_CHECKING:
@@ -37,6 +40,8 @@ if TYPE_CHECKING:
 
 logger = get_logger(__name__)
 
+T = TypeVar("T")
+
 JETSTREAM = JStream(
     name="FastAgency",
     subjects=[
@@ -46,7 +51,7 @@ JETSTREAM = JStream(
         # we create this topic dynamically => client process consuming NATS can fix its worker
         "chat.client.messages.*.*",
         # server prints message to client; chat.server.messages.<user_uuid>.<workflow_uuid>
-        # we create this topic dynamically and subscribe to it => worker is fixed
+        # every worker subscribes to all of them and routes them to its own workflows
         "chat.server.messages.*.*",
         # discovery subject
         "discovery",
@@ -54,6 +59,63 @@ JETSTREAM = JStream(
 )
 
 
+@dataclass
+class NatsWorkflowSession:
+    """State of a single workflow run by a NatsAdapter worker."""
+
+    workflow_uuid: str
+    user_id: str
+    # futures of the questions waiting for the answer, keyed by question_uuid
+    pending_questions: dict[str, "asyncio.Future[InputResponseModel]"] = field(
+        default_factory=dict
+    )
+
+    @property
+    def input_request_subject(self) -> str:
+        return f"chat.client.messages.{self.user_id}.{self.workflow_uuid}"
+
+    @property
+    def input_receive_subject(self) -> str:
+        return f"chat.server.messages.{self.user_id}.{self.workflow_uuid}"
+
+    def register_question(
+        self, question_id: str
+    ) -> "asyncio.Future[InputResponseModel]":
+        """Register a future for the question, resolved when the answer arrives.
+
+        Args:
+            question_id (str): The question ID.
+        """
+        future: asyncio.Future[InputResponseModel] = (
+            asyncio.get_running_loop().create_future()
+        )
+        self.pending_questions[question_id] = future
+        return future
+
+    def resolve_question(self, response: InputResponseModel) -> bool:
+        """Resolve the future of the question the response is answering.
+
+        Args:
+            response (InputResponseModel): The response.
+
+        Returns:
+            bool: False if nobody is waiting for the response.
+        """
+        question_id = response.question_uuid.hex if response.question_uuid else "None"
+        future = self.pending_questions.get(question_id)
+        if future is None or future.done():
+            return False
+
+        future.set_result(response)
+        return True
+
+    def cancel_pending_questions(self) -> None:
+        """Cancel all the questions still waiting for the answer."""
+        for future in self.pending_questions.values():
+            future.cancel()
+        self.pending_questions.clear()
+
+
 class NatsAdapter(MessageProcessorMixin, CreateWorkflowUIMixin):
     def __init__(
         self,
@@ -63,6 +125,7 @@ class NatsAdapter(MessageProcessorMixin, CreateWorkflowUIMixin):
         user: Optional[str] = None,
         password: Optional[str] = None,
         super_conversation: Optional["NatsAdapter"] = None,
+        max_concurrent_workflows: int = 40,
     ) -> None:
         """Provider for NATS.
 
@@ -72,58 +135,109 @@ class NatsAdapter(MessageProcessorMixin, CreateWorkflowUIMixin):
             user (Optional[str], optional): The user. Defaults to None.
             password (Optional[str], optional): The password. Defaults to None.
             super_conversation (Optional["NatsProvider"], optional): The super conversation. Defaults to None.
+            max_concurrent_workflows (int, optional): The maximum number of workflows running on this worker at the same time. New workflows are fetched from NATS only when a slot is free. Defaults to 40.
         """
+        if max_concurrent_workflows < 1:
+            raise ValueError("max_concurrent_workflows must be at least 1")
+
         self.provider = provider
         self.nats_url = nats_url or "nats://localhost:4222"
         self.user = user
         self.password = password
-        self.queue: Queue = Queue()  # type: ignore[type-arg]
+
+        self.max_concurrent_workflows = max_concurrent_workflows
+        # admission control for new workflows and the dedicated threads running them
+        self._workflow_slots = Semaphore(max_concurrent_workflows)
+        self._workflow_limiter = CapacityLimiter(max_concurrent_workflows)
+
+        # sessions of the workflows running on this worker, keyed by workflow_uuid
+        self._sessions: dict[str, NatsWorkflowSession] = {}
+        self._background_tasks: set[asyncio.Task[None]] = set()
 
         self.broker = NatsBroker(self.nats_url, user=user, password=password)
         self.app = FastStream(self.broker)
-        self.subscriber: "AsyncAPISubscriber"
-        self._input_request_subject: str
-        self._input_receive_subject: str
 
         self.super_conversation: Optional[NatsAdapter] = super_conversation
         self.sub_conversations: list[NatsAdapter] = []
 
         self._create_initiate_subscriber()
+        self._create_input_subscriber()
 
     async def _handle_input(
         self, body: InputResponseModel, msg: NatsMessage, logger: Logger
     ) -> None:
         """Handle input from the client by consuming messages from chat.server.messages.*.*.
 
+        The message is routed to the session of the workflow encoded in the
+        subject. Messages for workflows running on other workers are ignored.
+
         Args:
             body (InputResponseModel): The body of the message.
             msg (NatsMessage): The message object.
             logger (Logger): The logger object (gets injected)
         """
-        logger.info(
-            f"Received message in subject '{self._input_receive_subject}': {body}"
-        )
+        subject = msg.raw_message.subject
         await msg.ack()
-        self.queue.put(msg)
 
-    async def _send_error_msg(self, e: Exception, logger: Logger) -> None:
+        # chat.server.messages.<user_uuid>.<workflow_uuid>
+        workflow_uuid = subject.rsplit(".", 1)[-1]
+        session = self._sessions.get(workflow_uuid)
+        if session is None:
+            logger.debug(f"Ignoring message for workflow not on this worker: {subject}")
+            return
+
+        logger.info(f"Received message in subject '{subject}': {body}")
+
+        if not session.resolve_question(body):
+            logger.warning(f"Received response for unknown question: {body}")
+
+    def _get_session(self, workflow_uuid: str) -> NatsWorkflowSession:
+        try:
+            return self._sessions[workflow_uuid]
+        except KeyError as e:
+            raise RuntimeError(
+                f"Workflow {workflow_uuid} not found in sessions: {list(self._sessions)}"
+            ) from e
+
+    async def _send_error_msg(
+        self, e: Exception, session: NatsWorkflowSession, logger: Logger
+    ) -> None:
         """Send an error message.
 
         Args:
             e (Exception): The exception.
+            session (NatsWorkflowSession): The session of the failed workflow.
             logger (Logger): The logger object (gets injected)
         """
         logger.error(f"Error in chat: {e}")
         logger.error(traceback.format_exc())
 
         error_msg = InputResponseModel(msg=str(e), error=True, question_uuid=None)
-        await self.broker.publish(error_msg, self._input_request_subject)
+        await self.broker.publish(error_msg, session.input_request_subject)
+
+    def _close_session(self, session: NatsWorkflowSession) -> None:
+        self._sessions.pop(session.workflow_uuid, None)
+        session.cancel_pending_questions()
+
+    def _create_input_subscriber(self) -> None:
+        # a single long-lived subscriber per worker instead of one per workflow;
+        # sessions are registered before their workflows start, so there is
+        # nothing to replay
+        subscriber = self.broker.subscriber(
+            "chat.server.messages.*.*",
+            stream=JETSTREAM,
+            deliver_policy=api.DeliverPolicy("new"),
+        )
+        subscriber(self._handle_input)
 
     def _create_initiate_subscriber(self) -> None:
+        # pull consumer shared by all workers: a worker fetches the next
+        # initiate message only when it has a free slot for it
         @self.broker.subscriber(
             "chat.server.initiate_chat",
             stream=JETSTREAM,
-            queue="initiate_workers",
+            durable="initiate_workers",
+            pull_sub=PullSub(batch_size=1),
             deliver_policy=api.DeliverPolicy("all"),
         )
         async def initiate_handler(
@@ -132,8 +246,9 @@ class NatsAdapter(MessageProcessorMixin, CreateWorkflowUIMixin):
             """Initiate the handler.
 
             1. Subscribes to the chat.server.initiate_chat topic.
-            2. When a message is consumed from the topic, it dynamically subscribes to the chat.server.messages.<user_uuid>.<workflow_uuid> topic.
-            3. Starts the chat workflow after successfully subscribing to the chat.server.messages.<user_uuid>.<workflow_uuid> topic.
+            2. When a message is consumed from the topic, it registers a session for the workflow so that messages from the chat.server.messages.<user_uuid>.<workflow_uuid> topic are routed to it.
+            3. Starts the chat workflow after the session is registered.
+            4. Returns only when there is a free slot for the next workflow, so no new initiate message is fetched before that.
 
             Args:
                 body (InitiateModel): The body of the message.
@@ -141,29 +256,18 @@ class NatsAdapter(MessageProcessorMixin, CreateWorkflowUIMixin):
                 logger (Logger): The logger object (gets injected)
 
             """
+            await self._workflow_slots.acquire()
             await msg.ack()
 
             logger.info(
                 f"Message in subject 'chat.server.initiate_chat': {body=} -> from process id {os.getpid()}"
             )
-            user_id = body.user_id if body.user_id else "None"
             workflow_uuid = body.workflow_uuid.hex
-            self._input_request_subject = (
-                f"chat.client.messages.{user_id}.{workflow_uuid}"
-            )
-            self._input_receive_subject = (
-                f"chat.server.messages.{user_id}.{workflow_uuid}"
-            )
-
-            # dynamically subscribe to the chat server
-            subscriber = self.broker.subscriber(
-                subject=self._input_receive_subject,
-                stream=JETSTREAM,
-                deliver_policy=api.DeliverPolicy("all"),
+            session = NatsWorkflowSession(
+                workflow_uuid=workflow_uuid,
+                user_id=body.user_id if body.user_id else "None",
             )
-            subscriber(self._handle_input)
-            self.broker.setup_subscriber(subscriber)
-            await subscriber.start()
+            self._sessions[workflow_uuid] = session
 
             try:
 
@@ -198,32 +302,46 @@ class NatsAdapter(MessageProcessorMixin, CreateWorkflowUIMixin):
                                 short=f"Unexpected error: {e}",
                                 long=traceback.format_exc(),
                             )
+                            ui.workflow_completed(
+                                sender="NatsAdapter",
+                                result=f"Unexpected error: {e}",
+                            )
                             return
 
-                    return await asyncify(_start_chat)(
+                    return await asyncify(_start_chat, limiter=self._workflow_limiter)(
                         ui_base, provider, name, params, workflow_uuid
                     )
 
-                background_tasks = set()
                 task = asyncio.create_task(
                     start_chat(
                         self, self.provider, body.name, body.params, workflow_uuid
                     )
-                )  # type: ignore
-                background_tasks.add(task)
+                )
+                self._background_tasks.add(task)
 
-                async def callback(t: asyncio.Task[Any]) -> None:
+                def callback(t: asyncio.Task[None]) -> None:
                     try:
-                        background_tasks.discard(t)
-                        await subscriber.close()
+                        self._background_tasks.discard(t)
+                        self._close_session(session)
                     except Exception as e:
                         logger.error(f"Error in callback: {e}")
                         logger.error(traceback.format_exc())
+                    finally:
+                        self._workflow_slots.release()
 
-                task.add_done_callback(lambda t: asyncio.create_task(callback(t)))
+                task.add_done_callback(callback)
 
             except Exception as e:
-                await self._send_error_msg(e, logger)
+                self._close_session(session)
+                self._workflow_slots.release()
+                await self._send_error_msg(e, session, logger)
+
+            # leave the next initiate message to other workers until a slot is free
+            await self._wait_for_free_workflow_slot()
+
+    async def _wait_for_free_workflow_slot(self) -> None:
+        async with self._workflow_slots:
+            pass
 
     async def _publish_discovery(self) -> None:
         """Publish the discovery message."""
@@ -248,26 +366,34 @@ class NatsAdapter(MessageProcessorMixin, CreateWorkflowUIMixin):
     def visit_default(self, message: IOMessage) -> None:
         content = message.model_dump()
         logger.debug(f"visit_default(): {content=}")
-        syncify(self.broker.publish)(content, self._input_request_subject)
+        session = self._get_session(message.workflow_uuid)
+        syncify(self.broker.publish)(content, session.input_request_subject)
 
     def visit_text_message(self, message: TextMessage) -> None:
         content = message.model_dump()
         logger.debug(f"visit_text_message(): {content=}")
-        syncify(self.broker.publish)(content, self._input_request_subject)
+        session = self._get_session(message.workflow_uuid)
+        syncify(self.broker.publish)(content, session.input_request_subject)
 
     async def _wait_for_question_response_with_timeout(
-        self, question_id: str, *, timeout: int = 180
+        self,
+        session: NatsWorkflowSession,
+        question_id: str,
+        *,
+        timeout: int = 180,  # noqa: ASYNC109
     ) -> InputResponseModel:
         """Wait for the question response.
 
         Args:
+            session (NatsWorkflowSession): The session of the workflow asking the question.
             question_id (str): The question ID.
             timeout (int, optional): The timeout in seconds. Defaults to 180.
         """
         try:
             # Set a timeout of 180 seconds
             return await asyncio.wait_for(
-                self._wait_for_question_response(question_id), timeout=timeout
+                self._wait_for_question_response(session, question_id),
+                timeout=timeout,
             )
         except asyncio.TimeoutError:
             logger.debug(
@@ -279,59 +405,53 @@ class NatsAdapter(MessageProcessorMixin, CreateWorkflowUIMixin):
                 error=True,
             )
 
-    # todo: we need to add timeout and handle it somehow
-    async def _wait_for_question_response(self, question_id: str) -> InputResponseModel:
-        while True:
-            while self.queue.empty():  # noqa: ASYNC110
-                await asyncio.sleep(0.1)
-
-            msg: NatsMessage = self.queue.get()
-            input_response = InputResponseModel.model_validate_json(
-                msg.raw_message.data.decode("utf-8")
-            )
-
-            question_id_hex = (
-                input_response.question_uuid.hex
-                if input_response.question_uuid
-                else "None"
-            )
-            logger.debug(question_id_hex)
-            logger.debug(question_id)
-            logger.debug(question_id_hex == question_id)
-            if question_id_hex == question_id:
-                logger.debug("Breaking the while loop")
-                break
-            else:
-                self.queue.put(msg)
+    async def _wait_for_question_response(
+        self, session: NatsWorkflowSession, question_id: str
+    ) -> InputResponseModel:
+        future = session.pending_questions.get(
+            question_id
+        ) or session.register_question(question_id)
+        try:
+            input_response = await future
+        finally:
+            session.pending_questions.pop(question_id, None)
 
         logger.debug("Got the response")
-        self.queue.task_done()
         return input_response
 
-    def visit_text_input(self, message: TextInput) -> str:
-        content = message.model_dump()
+    async def _ask_question(self, message: AskingMessage) -> InputResponseModel:
+        """Publish the question and wait for the response.
+
+        The future is registered before publishing so that the answer cannot
+        arrive before anyone is waiting for it.
+
+        Args:
+            message (AskingMessage): The question.
+        """
+        session = self._get_session(message.workflow_uuid)
         question_id = message.uuid
-        logger.info(f"visit_text_input(): {content=}")
-        syncify(self.broker.publish)(content, self._input_request_subject)
+        content = message.model_dump()
+        session.register_question(question_id)
+        try:
+            await self.broker.publish(content, session.input_request_subject)
+        except Exception:
+            session.pending_questions.pop(question_id, None)
+            raise
         logger.info(
-            f"visit_text_input(): published message '{content}' to {self._input_request_subject}"
+            f"_ask_question(): published message '{content}' to {session.input_request_subject}"
         )
 
-        input_response: InputResponseModel = syncify(
-            self._wait_for_question_response_with_timeout
-        )(question_id=question_id)
+        return await self._wait_for_question_response_with_timeout(session, question_id)
+
+    def visit_text_input(self, message: TextInput) -> str:
+        logger.info(f"visit_text_input(): {message=}")
+        input_response: InputResponseModel = syncify(self._ask_question)(message)
         logger.info(input_response)
         return input_response.msg
 
     def visit_multiple_choice(self, message: MultipleChoice) -> str:
-        content = message.model_dump()
-        question_id = message.uuid
-        logger.info(f"visit_multiple_choice(): {content=}")
-        syncify(self.broker.publish)(content, self._input_request_subject)
-
-        input_response: InputResponseModel = syncify(
-            self._wait_for_question_response_with_timeout
-        )(question_id=question_id)
+        logger.info(f"visit_multiple_choice(): {message=}")
+        input_response: InputResponseModel = syncify(self._ask_question)(message)
         logger.info(input_response)
         return input_response.msg
 
@@ -398,9 +518,46 @@ class NatsProvider(ProviderProtocol):
 
         self.is_broker_running: bool = False
 
+        # long-lived event loop running in a background thread; it owns the
+        # broker and NATS connections shared by all runs and the discovery watch
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+        self._broker_lock: Optional[asyncio.Lock] = None
+        self._nats_client: Optional[NatsClient] = None
+        # threads processing messages in the UI, one per run blocked on a question
+        self._ui_limiter = CapacityLimiter(math.inf)
+
+        # discovery cache (name -> description) kept current by a KV watch; it
+        # is replaced as a whole on every update so readers always see a snapshot
+        self._discovery: dict[str, str] = {}
+        self._discovery_synced: Optional[asyncio.Event] = None
+        self._discovery_task: Optional[asyncio.Task[None]] = None
+
+    async def _start_broker(self) -> None:
+        """Start the broker shared by all runs (in the background event loop)."""
+        if self._broker_lock is None:
+            self._broker_lock = asyncio.Lock()
+        async with self._broker_lock:
+            if not self.is_broker_running:
+                await self.broker.start()
+                self.is_broker_running = True
+                logger.debug("Broker started")
+
     async def _setup_subscriber(
-        self, ui: UI, from_server_subject: str, to_server_subject: str
-    ) -> None:
+        self,
+        ui: UI,
+        from_server_subject: str,
+        to_server_subject: str,
+        completed: "asyncio.Future[None]",
+    ) -> "AsyncAPISubscriber":
+        """Subscribe to the messages of a workflow.
+
+        Args:
+            ui (UI): The UI processing the messages.
+            from_server_subject (str): The subject the workflow publishes to.
+            to_server_subject (str): The subject the responses are sent to.
+            completed (asyncio.Future[None]): Resolved when the workflow is completed or has failed.
+        """
         logger.info(
             f"Setting up subscriber for {from_server_subject=}, {to_server_subject=}"
         )
@@ -412,15 +569,22 @@ class NatsProvider(ProviderProtocol):
                 if msg.get("error")
                 else IOMessage.create(**msg)
             )
+            # the UI may block (e.g. waiting for the user), keep it off the shared loop
+            processed_message = await asyncify(
+                ui.process_message, limiter=self._ui_limiter
+            )(iomessage)
             if isinstance(iomessage, AskingMessage):
-                processed_message = ui.process_message(iomessage)
                 response = InputResponseModel(
                     msg=processed_message, question_uuid=iomessage.uuid
                 )
                 logger.debug(f"Processed response: {response}")
                 await self.broker.publish(response, to_server_subject)
-            else:
-                ui.process_message(iomessage)
+
+            # errors published by the adapter itself are not followed by WorkflowCompleted
+            if (msg.get("error") or isinstance(iomessage, WorkflowCompleted)) and (
+                not completed.done()
+            ):
+                completed.set_result(None)
 
         subscriber = self.broker.subscriber(
             from_server_subject,
@@ -432,15 +596,22 @@ class NatsProvider(ProviderProtocol):
         await subscriber.start()
         logger.info(f"Subscriber for {from_server_subject} started")
 
-    def run(
+        return subscriber
+
+    async def _remove_subscriber(self, subscriber: "AsyncAPISubscriber") -> None:
+        await subscriber.close()
+        # dynamic subscribers are registered in the broker, drop them so they do not pile up
+        self.broker._subscribers.pop(hash(subscriber), None)
+
+    async def _arun(
         self,
         name: str,
         ui: UI,
         user_id: Optional[str] = None,
         **kwargs: Any,
     ) -> str:
-        # subscribe to whatever topic you need
-        # consume a message from the topic and call that visitor pattern (which is happening in NatsProvider)
+        await self._start_broker()
+
         workflow_uuid = ui._workflow_uuid
         init_message = InitiateWorkflowModel(
             user_id=user_id,
@@ -451,98 +622,149 @@ class NatsProvider(ProviderProtocol):
         _from_server_subject = f"chat.client.messages.{user_id}.{workflow_uuid}"
         _to_server_subject = f"chat.server.messages.{user_id}.{workflow_uuid}"
 
-        async def send_initiate_chat_msg() -> None:
+        completed: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        subscriber = await self._setup_subscriber(
+            ui, _from_server_subject, _to_server_subject, completed
+        )
+        try:
             await self.broker.publish(init_message, self._initiate_chat_subject)
             logger.info("Initiate chat message sent")
 
-        @asynccontextmanager
-        async def lifespan() -> AsyncIterator[None]:
-            async with self.broker:
-                await self.broker.start()
-                logger.debug("Broker started")
-                try:
-                    yield
-                finally:
-                    await self.broker.close()
-
-        async def _setup_and_run() -> None:
-            await send_initiate_chat_msg()
-            await self._setup_subscriber(ui, _from_server_subject, _to_server_subject)
-            while True:  # noqa: ASYNC110
-                await asyncio.sleep(0.1)
-
-        async def run_lifespan() -> None:
-            if not self.is_broker_running:
-                self.is_broker_running = True
-                async with lifespan():
-                    await _setup_and_run()
-            else:
-                await _setup_and_run()
-
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-
-        loop.run_until_complete(run_lifespan())
+            await completed
+        finally:
+            await self._remove_subscriber(subscriber)
 
         return "NatsWorkflows.run() completed"
 
-    @asynccontextmanager
-    async def _get_jetstream_context(self) -> AsyncIterator[JetStreamContext]:
-        nc = NatsClient()
-        await nc.connect(self.nats_url, user=self.user, password=self.password)
-        js = nc.jetstream()
-        try:
-            yield js
-        finally:
-            await nc.close()
+    def run(
+        self,
+        name: str,
+        ui: UI,
+        user_id: Optional[str] = None,
+        **kwargs: Any,
+    ) -> str:
+        # subscribe to whatever topic you need
+        # consume a message from the topic and call that visitor pattern (which is happening in NatsProvider)
+        return self._run_in_loop(self._arun(name, ui, user_id, **kwargs))
+
+    async def _aclose(self) -> None:
+        if self._discovery_task is not None:
+            self._discovery_task.cancel()
+        if self.is_broker_running:
+            await self.broker.close()
+            self.is_broker_running = False
+        if self._nats_client is not None and not self._nats_client.is_closed:
+            await self._nats_client.close()
+
+    def close(self) -> None:
+        """Close the NATS connections and stop the background event loop."""
+        with self._loop_lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+
+        asyncio.run_coroutine_threadsafe(self._aclose(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=loop.run_forever,
+                    name=f"NatsProvider-{id(self)}",
+                    daemon=True,
+                ).start()
+                self._loop = loop
+        return self._loop
+
+    def _run_in_loop(self, coro: Coroutine[Any, Any, T]) -> T:
+        """Run the coroutine in the background event loop and wait for the result."""
+        return asyncio.run_coroutine_threadsafe(coro, self._get_loop()).result()
+
+    async def _get_nats_client(self) -> NatsClient:
+        if self._nats_client is None or self._nats_client.is_closed:
+            nc = NatsClient()
+            try:
+                await nc.connect(self.nats_url, user=self.user, password=self.password)
+            except NoServersError as e:
+                raise FastAgencyNATSConnectionError(
+                    f"Unable to connect to NATS server at {self.nats_url}"
+                ) from e
+            self._nats_client = nc
+        return self._nats_client
+
+    async def _get_jetstream_key_value(self, bucket: str = "discovery") -> KeyValue:
+        nc = await self._get_nats_client()
+        return await nc.jetstream().create_key_value(bucket=bucket)
+
+    def _update_discovery(self, entry: KeyValue.Entry) -> None:
+        discovery = dict(self._discovery)
+        if entry.operation in ("DEL", "PURGE"):
+            discovery.pop(entry.key, None)
+        else:
+            discovery[entry.key] = entry.value.decode() if entry.value else ""
+        self._discovery = discovery
+
+    async def _watch_discovery(self, synced: asyncio.Event) -> None:
+        kv = await self._get_jetstream_key_value()
+        watcher = await kv.watchall()
+        async for entry in watcher:
+            # None marks that all the existing values were delivered
+            if entry is None:
+                synced.set()
+            else:
+                self._update_discovery(entry)
+                logger.debug(f"Discovery updated: {entry.key}")
+
+    async def _get_discovery(self) -> dict[str, str]:
+        """Return the discovery cache, starting the KV watch if it is not running."""
+        synced, watch_task = self._discovery_synced, self._discovery_task
+        if synced is None or watch_task is None or watch_task.done():
+            self._discovery = {}
+            synced = self._discovery_synced = asyncio.Event()
+            watch_task = self._discovery_task = asyncio.create_task(
+                self._watch_discovery(synced)
+            )
 
-    @asynccontextmanager
-    async def _get_jetstream_key_value(
-        self, bucket: str = "discovery"
-    ) -> AsyncIterator[KeyValue]:
-        async with self._get_jetstream_context() as js:
-            kv = await js.create_key_value(bucket=bucket)
-            yield kv
-
-    async def _get_names(self) -> list[str]:
-        try:
-            async with self._get_jetstream_key_value() as kv:
-                names = await kv.keys()
-        except NoKeysError:
-            names = []
-        except NoServersError as e:
+        synced_task = asyncio.create_task(synced.wait())
+        await asyncio.wait(
+            {watch_task, synced_task}, return_when=asyncio.FIRST_COMPLETED
+        )
+        if not synced_task.done():
+            synced_task.cancel()
+            # the watch failed before the cache was populated, reraise its error
+            watch_task.result()
             raise FastAgencyNATSConnectionError(
-                f"Unable to connect to NATS server at {self.nats_url}"
-            ) from e
+                f"Discovery watch on NATS server at {self.nats_url} stopped"
+            )
 
-        return names
+        return self._discovery
 
-    async def _get_description(self, name: str) -> str:
-        try:
-            async with self._get_jetstream_key_value() as kv:
-                description = await kv.get(name)
-            return description.value.decode() if description.value else ""
-        except KeyNotFoundError as e:
-            raise FastAgencyNATSKeyError(
-                f"Workflow name {name} not found to get description"
-            ) from e
-        except NoServersError as e:
-            raise FastAgencyNATSConnectionError(
-                f"Unable to connect to NATS server at {self.nats_url}"
-            ) from e
+    def _get_discovery_cache(self) -> dict[str, str]:
+        # no round trip to the background loop once the watch is in sync
+        if (
+            self._discovery_synced is not None
+            and self._discovery_synced.is_set()
+            and self._discovery_task is not None
+            and not self._discovery_task.done()
+        ):
+            return self._discovery
+
+        return self._run_in_loop(self._get_discovery())
 
     @property
     def names(self) -> list[str]:
-        names = asyncio.run(self._get_names())
+        names = list(self._get_discovery_cache())
         logger.debug(f"Names: {names}")
-        # return ["simple_learning"]
         return names
 
     def get_description(self, name: str) -> str:
-        description = asyncio.run(self._get_description(name))
+        try:
+            description = self._get_discovery_cache()[name]
+        except KeyError as e:
+            raise FastAgencyNATSKeyError(
+                f"Workflow name {name} not found to get description"
+            ) from e
         logger.debug(f"Description: {description}")
-        # return "Student and teacher learning chat"
         return description
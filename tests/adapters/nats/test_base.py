@@ -0,0 +1,326 @@
+import asyncio
+import threading
+import time
+from typing import Any, Optional
+from unittest.mock import AsyncMock, MagicMock
+from uuid import uuid4
+
+import pytest
+from nats.js.kv import KeyValue
+
+from fastagency.adapters.nats import NatsAdapter, NatsProvider, NatsWorkflowSession
+from fastagency.base import UI
+from fastagency.exceptions import FastAgencyNATSKeyError
+from fastagency.messages import InputResponseModel, TextMessage, WorkflowCompleted
+
+
+@pytest.fixture
+def adapter() -> NatsAdapter:
+    return NatsAdapter(provider=MagicMock())
+
+
+def create_session(adapter: NatsAdapter) -> NatsWorkflowSession:
+    session = NatsWorkflowSession(workflow_uuid=uuid4().hex, user_id="None")
+    adapter._sessions[session.workflow_uuid] = session
+    return session
+
+
+def create_nats_message(subject: str) -> MagicMock:
+    msg = MagicMock()
+    msg.ack = AsyncMock()
+    msg.raw_message.subject = subject
+    return msg
+
+
+class TestAdmissionControl:
+    def test_initiate_subscriber_is_pull_based(self, adapter: NatsAdapter) -> None:
+        subscribers: dict[str, Any] = {
+            s.subject: s for s in adapter.broker._subscribers.values()
+        }
+        subscriber = subscribers["chat.server.initiate_chat"]
+
+        assert subscriber.pull_sub is not None
+        assert subscriber.pull_sub.batch_size == 1
+
+    def test_invalid_max_concurrent_workflows(self) -> None:
+        with pytest.raises(ValueError, match="max_concurrent_workflows"):
+            NatsAdapter(provider=MagicMock(), max_concurrent_workflows=0)
+
+    @pytest.mark.asyncio
+    async def test_wait_for_free_workflow_slot(self) -> None:
+        adapter = NatsAdapter(provider=MagicMock(), max_concurrent_workflows=2)
+
+        await adapter._workflow_slots.acquire()
+        await asyncio.wait_for(adapter._wait_for_free_workflow_slot(), timeout=1)
+
+        await adapter._workflow_slots.acquire()
+        waiter = asyncio.create_task(adapter._wait_for_free_workflow_slot())
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+
+        adapter._workflow_slots.release()
+        await asyncio.wait_for(waiter, timeout=1)
+        assert adapter._workflow_slots.value == 1
+
+
+class TestInputSubscriber:
+    def test_single_wildcard_subscriber(self, adapter: NatsAdapter) -> None:
+        subjects = [s.subject for s in adapter.broker._subscribers.values()]
+        assert subjects.count("chat.server.messages.*.*") == 1
+
+    @pytest.mark.asyncio
+    async def test_handle_input_ignores_other_workers_workflow(
+        self, adapter: NatsAdapter
+    ) -> None:
+        session = create_session(adapter)
+        msg = create_nats_message(f"chat.server.messages.None.{uuid4().hex}")
+        body = InputResponseModel(msg="answer", question_uuid=uuid4())
+        await adapter._handle_input(body, msg, MagicMock())
+
+        msg.ack.assert_awaited_once()
+        assert session.pending_questions == {}
+
+
+class TestPendingQuestions:
+    @pytest.mark.asyncio
+    async def test_handle_input_resolves_question(self, adapter: NatsAdapter) -> None:
+        session = create_session(adapter)
+        question_uuid = uuid4()
+        waiter = asyncio.create_task(
+            adapter._wait_for_question_response(session, question_uuid.hex)
+        )
+        await asyncio.sleep(0)
+
+        body = InputResponseModel(msg="answer", question_uuid=question_uuid)
+        msg = create_nats_message(session.input_receive_subject)
+        await adapter._handle_input(body, msg, MagicMock())
+
+        assert (await waiter).msg == "answer"
+        assert session.pending_questions == {}
+
+    @pytest.mark.asyncio
+    async def test_handle_input_ignores_unknown_question(
+        self, adapter: NatsAdapter
+    ) -> None:
+        session = create_session(adapter)
+        msg = create_nats_message(session.input_receive_subject)
+        body = InputResponseModel(msg="answer", question_uuid=uuid4())
+        await adapter._handle_input(body, msg, MagicMock())
+
+        msg.ack.assert_awaited_once()
+        assert session.pending_questions == {}
+
+    @pytest.mark.asyncio
+    async def test_handle_input_routes_to_session(self, adapter: NatsAdapter) -> None:
+        sessions = [create_session(adapter) for _ in range(2)]
+        question_uuid = uuid4()
+        waiters = [
+            asyncio.create_task(
+                adapter._wait_for_question_response(session, question_uuid.hex)
+            )
+            for session in sessions
+        ]
+        await asyncio.sleep(0)
+
+        body = InputResponseModel(msg="answer", question_uuid=question_uuid)
+        msg = create_nats_message(sessions[1].input_receive_subject)
+        await adapter._handle_input(body, msg, MagicMock())
+
+        assert (await waiters[1]).msg == "answer"
+        assert not waiters[0].done()
+        assert list(sessions[0].pending_questions) == [question_uuid.hex]
+
+        waiters[0].cancel()
+
+    @pytest.mark.asyncio
+    async def test_reply_latency_with_parked_questions(
+        self, adapter: NatsAdapter
+    ) -> None:
+        session = create_session(adapter)
+        n_parked = 1_000
+        question_uuids = [uuid4() for _ in range(n_parked)]
+        waiters = [
+            asyncio.create_task(adapter._wait_for_question_response(session, q.hex))
+            for q in question_uuids
+        ]
+        await asyncio.sleep(0)
+        assert len(session.pending_questions) == n_parked
+
+        latencies = []
+        for question_uuid, waiter in zip(question_uuids[::-1], waiters[::-1]):
+            body = InputResponseModel(msg="answer", question_uuid=question_uuid)
+            msg = create_nats_message(session.input_receive_subject)
+            start = time.perf_counter()
+            await adapter._handle_input(body, msg, MagicMock())
+            await waiter
+            latencies.append(time.perf_counter() - start)
+
+        latencies.sort()
+        p99 = latencies[int(len(latencies) * 0.99)]
+        # polling the shared queue added at least 100 ms to every reply
+        assert p99 < 0.01, f"p99 reply latency {p99 * 1000:.3f} ms"
+        assert session.pending_questions == {}
+
+
+def create_kv_entry(
+    key: str, value: Optional[bytes] = None, operation: Optional[str] = None
+) -> KeyValue.Entry:
+    return KeyValue.Entry(
+        bucket="discovery",
+        key=key,
+        value=value,
+        revision=None,
+        delta=None,
+        created=None,
+        operation=operation,
+    )
+
+
+class FakeKeyWatcher:
+    def __init__(self, entries: list[KeyValue.Entry]) -> None:
+        """Watcher delivering the entries followed by the init done marker."""
+        self.updates: asyncio.Queue[Optional[KeyValue.Entry]] = asyncio.Queue()
+        for entry in entries:
+            self.updates.put_nowait(entry)
+        self.updates.put_nowait(None)
+
+    def __aiter__(self) -> "FakeKeyWatcher":  # noqa: D105
+        return self
+
+    async def __anext__(self) -> Optional[KeyValue.Entry]:  # noqa: D105
+        return await self.updates.get()
+
+
+class FakeKeyValue:
+    def __init__(self, entries: list[KeyValue.Entry]) -> None:
+        """Key-value bucket with a single watchable set of entries."""
+        self.entries = entries
+        self.watcher: Optional[FakeKeyWatcher] = None
+
+    async def watchall(self) -> FakeKeyWatcher:
+        self.watcher = FakeKeyWatcher(self.entries)
+        return self.watcher
+
+
+class TestNatsProviderDiscovery:
+    @pytest.fixture
+    def kv(self) -> FakeKeyValue:
+        return FakeKeyValue(
+            [
+                create_kv_entry("simple_learning", b"Student and teacher learning"),
+                create_kv_entry("whatsapp", b"WhatsApp chat"),
+            ]
+        )
+
+    @pytest.fixture
+    def provider(
+        self, kv: FakeKeyValue, monkeypatch: pytest.MonkeyPatch
+    ) -> NatsProvider:
+        provider = NatsProvider()
+        get_kv = AsyncMock(return_value=kv)
+        monkeypatch.setattr(provider, "_get_jetstream_key_value", get_kv)
+        return provider
+
+    def test_discovery_is_cached(self, provider: NatsProvider) -> None:
+        assert provider.names == ["simple_learning", "whatsapp"]
+        descriptions = [provider.get_description(name) for name in provider.names]
+        assert descriptions == ["Student and teacher learning", "WhatsApp chat"]
+
+        get_kv: AsyncMock = provider._get_jetstream_key_value  # type: ignore[assignment]
+        get_kv.assert_awaited_once()
+
+    def test_unknown_name(self, provider: NatsProvider) -> None:
+        with pytest.raises(FastAgencyNATSKeyError):
+            provider.get_description("unknown")
+
+    def test_discovery_follows_watch(
+        self, provider: NatsProvider, kv: FakeKeyValue
+    ) -> None:
+        assert provider.names == ["simple_learning", "whatsapp"]
+        assert kv.watcher is not None
+
+        updates = [
+            create_kv_entry("whatsapp", operation="DEL"),
+            create_kv_entry("websurfer", b"Web surfing"),
+        ]
+        for entry in updates:
+            provider._run_in_loop(kv.watcher.updates.put(entry))
+
+        deadline = time.monotonic() + 1
+        while provider.names != ["simple_learning", "websurfer"]:
+            assert time.monotonic() < deadline, provider.names
+            time.sleep(0.01)
+
+        assert provider.get_description("websurfer") == "Web surfing"
+
+
+class TestNatsProviderRun:
+    @pytest.fixture
+    def provider(self, monkeypatch: pytest.MonkeyPatch) -> NatsProvider:
+        provider = NatsProvider()
+        monkeypatch.setattr(provider.broker, "start", AsyncMock())
+        monkeypatch.setattr(provider.broker, "publish", AsyncMock())
+        monkeypatch.setattr(provider.broker, "setup_subscriber", MagicMock())
+
+        self.subscriber = MagicMock()
+        self.subscriber.start = AsyncMock()
+        self.subscriber.close = AsyncMock()
+        self.handlers: list[Any] = []
+        self.subscriber.side_effect = self.handlers.append
+        monkeypatch.setattr(
+            provider.broker, "subscriber", MagicMock(return_value=self.subscriber)
+        )
+        return provider
+
+    def _start_run(self, provider: NatsProvider, ui: UI) -> threading.Thread:
+        thread = threading.Thread(target=provider.run, args=("simple", ui))
+        thread.start()
+
+        deadline = time.monotonic() + 1
+        while not self.handlers:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+
+        return thread
+
+    @pytest.mark.parametrize(
+        "final_msg",
+        [
+            WorkflowCompleted(workflow_uuid="wf", result="ok").model_dump(),
+            {"msg": "Unexpected error", "question_uuid": None, "error": True},
+        ],
+    )
+    def test_run_returns_on_completion(
+        self, provider: NatsProvider, final_msg: dict[str, Any]
+    ) -> None:
+        ui_base = MagicMock()
+        ui = UI(uibase=ui_base, workflow_uuid=uuid4().hex)
+
+        thread = self._start_run(provider, ui)
+        (handler,) = self.handlers
+
+        text_message = TextMessage(workflow_uuid="wf", body="hello").model_dump()
+        provider._run_in_loop(handler(text_message, MagicMock()))
+        assert thread.is_alive()
+
+        provider._run_in_loop(handler(final_msg, MagicMock()))
+        thread.join(timeout=1)
+        assert not thread.is_alive()
+
+        assert ui_base.process_message.call_count == 2
+        self.subscriber.close.assert_awaited_once()
+        assert hash(self.subscriber) not in provider.broker._subscribers
+
+    def test_broker_is_shared_across_runs(self, provider: NatsProvider) -> None:
+        for _ in range(3):
+            ui = UI(uibase=MagicMock(), workflow_uuid=uuid4().hex)
+            thread = self._start_run(provider, ui)
+            handler = self.handlers.pop()
+            completed = WorkflowCompleted(workflow_uuid=ui.workflow_uuid)
+            provider._run_in_loop(handler(completed.model_dump(), MagicMock()))
+            thread.join(timeout=1)
+            assert not thread.is_alive()
+
+        start: AsyncMock = provider.broker.start  # type: ignore[assignment]
+        start.assert_awaited_once()
+        assert provider.is_broker_running